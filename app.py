@@ -1,12 +1,16 @@
 import streamlit as st
+import atexit
+import queue
+import subprocess
 import tempfile
+import threading
 import time
 import os
+from concurrent.futures import ThreadPoolExecutor, wait
 import cv2
 import numpy as np
 import sounddevice as sd
-from scipy.io.wavfile import write
-from moviepy import VideoFileClip, AudioFileClip
+from scipy.signal import resample_poly
 from utils import visual_feature_extraction, deep_lip_decode, translate_content
 
 # --- 1. PAGE CONFIGURATION ---
@@ -23,9 +27,11 @@ if 'input_method' not in st.session_state: st.session_state.input_method = None
 if 'target_lang' not in st.session_state: st.session_state.target_lang = "English"
 if 'target_lang_code' not in st.session_state: st.session_state.target_lang_code = 'en'
 if 'video_path' not in st.session_state: st.session_state.video_path = None
+if 'video_bytes' not in st.session_state: st.session_state.video_bytes = None
+if 'speech_audio' not in st.session_state: st.session_state.speech_audio = None
 
 # --- 3. CUSTOM CSS (Bangalore Dark Blue Theme) ---
-st.markdown("""
+CUSTOM_CSS = """
     <style>
     /* Main Background */
     .stApp { background-color: #020c1b; color: white; }
@@ -59,7 +65,23 @@ st.markdown("""
     /* Hide Uploader Text Color Fix */
     .css-1544g2n { color: white !important; }
     </style>
-""", unsafe_allow_html=True)
+"""
+
+# Result card, filled in with str.format() once the pipeline finishes
+RESULT_TEMPLATE = """
+    <div class="result-container">
+        <h3 style="color:#64ffda; text-align:left; margin:0;">Output ({lang})</h3>
+        <br>
+        <div style="background: rgba(255,255,255,0.1); padding: 15px; border-radius: 10px;">
+            <h2 style="color:white; margin:0; text-align:left; font-size: 1.2rem;">"{translated}"</h2>
+            <hr style="border-color: rgba(255,255,255,0.2);">
+            <p style="margin:0; font-size:13px; color:#a8b2d1;">Original Transcript:<br>"{raw_text}"</p>
+        </div>
+    </div>
+"""
+
+# Re-sent on every rerun: Streamlit drops elements that a run does not emit again
+st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
 
 
 # --- NAVIGATION FUNCTIONS ---
@@ -72,11 +94,17 @@ def prev_page(): st.session_state.page -= 1
 def reset_app():
     st.session_state.page = 1
     st.session_state.video_path = None
+    st.session_state.video_bytes = None
+    st.session_state.speech_audio = None
     st.session_state.input_method = None
 
 
 def set_input(method):
     st.session_state.input_method = method
+    if method == "live":
+        # Open the webcam and pick the encoder now, not when recording starts
+        get_camera()
+        get_video_encoder()
     next_page()
 
 
@@ -87,68 +115,243 @@ def set_language(name, code):
 
 
 # --- 4. ADVANCED RECORDER (Audio + Video) ---
-def record_av_segment(duration=60):
-    # 1. Setup Audio
-    fs = 44100  # Sample rate
+RECORD_SIZE = (640, 480)  # Plenty for mouth crops; full-HD frames only bloat the file
+PREVIEW_SIZE = (320, 240)  # Live preview thumbnail
 
-    # Start Audio Recording (Non-blocking background process)
-    myrecording = sd.rec(int(duration * fs), samplerate=fs, channels=1)
 
-    # 2. Setup Video
+@st.cache_resource(validate=lambda cap: cap.isOpened())
+def get_camera():
+    # Opened once and kept warm: many drivers take 1-3 s to open the device
     cap = cv2.VideoCapture(0)
-    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    fps = 20.0
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, RECORD_SIZE[0])
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, RECORD_SIZE[1])
+    atexit.register(cap.release)
+    return cap
 
-    # Temp files
-    temp_vid = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
-    temp_audio = tempfile.NamedTemporaryFile(delete=False, suffix='.wav')
-    final_output = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
 
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    out = cv2.VideoWriter(temp_vid.name, fourcc, fps, (width, height))
+@st.cache_resource
+def get_camera_lock():
+    # cv2.VideoCapture isn't thread-safe: one take (one capture worker) owns the shared camera at a time
+    return threading.Lock()
 
-    st_ph = st.empty()
 
-    # 3. Recording Loop
-    start_time = time.time()
-    while (time.time() - start_time) < duration:
-        ret, frame = cap.read()
-        if not ret: break
-        out.write(frame)
-        st_ph.image(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), caption="Recording...")
+# Hardware H.264 encoders in order of preference: (global options, output options)
+HW_VIDEO_ENCODERS = {
+    'h264_nvenc': ([], ['-c:v', 'h264_nvenc', '-preset', 'p1', '-pix_fmt', 'yuv420p']),
+    'h264_vaapi': (['-vaapi_device', '/dev/dri/renderD128'], ['-vf', 'format=nv12,hwupload', '-c:v', 'h264_vaapi']),
+    'h264_videotoolbox': ([], ['-c:v', 'h264_videotoolbox', '-pix_fmt', 'yuv420p']),
+}
+# Software fallback: libx264's fastest preset
+SW_VIDEO_ENCODER = ([], ['-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p'])
 
-    # 4. Stop & Save Raw Files
-    cap.release()
-    out.release()
-    sd.wait()  # Wait for audio to finish
-    write(temp_audio.name, fs, myrecording)  # Save WAV
 
-    st_ph.empty()
-    st.info("Processing Media...")
-
-    # 5. Merge Audio & Video using MoviePy
+@st.cache_resource
+def get_video_encoder():
+    # Checked once per process: the encoder must be in this ffmpeg build AND open on this machine
     try:
-        video_clip = VideoFileClip(temp_vid.name)
-        audio_clip = AudioFileClip(temp_audio.name)
+        listed = subprocess.run(["ffmpeg", "-hide_banner", "-encoders"], capture_output=True, text=True).stdout
+    except FileNotFoundError:
+        return SW_VIDEO_ENCODER  # The recorder reports the missing ffmpeg itself
+
+    for name, (global_opts, output_opts) in HW_VIDEO_ENCODERS.items():
+        if name not in listed: continue
+        try:
+            probe = subprocess.run([
+                "ffmpeg", "-hide_banner", *global_opts,
+                "-f", "lavfi", "-i", "color=size=256x256:duration=0.1",
+                *output_opts, "-f", "null", "-"
+            ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=10)
+        except subprocess.TimeoutExpired:
+            continue
+        if probe.returncode == 0:
+            return global_opts, output_opts
+    return SW_VIDEO_ENCODER
+
+
+def start_av_encoder(path, fps, size, fs, audio_fd):
+    # One ffmpeg process: raw BGR frames on stdin + 16-bit PCM on audio_fd -> final muxed MP4
+    global_opts, output_opts = get_video_encoder()
+    return subprocess.Popen([
+        "ffmpeg", "-y", *global_opts,
+        "-thread_queue_size", "512",
+        "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{size[0]}x{size[1]}", "-r", str(fps),
+        "-i", "pipe:0",
+        "-thread_queue_size", "512",
+        "-f", "s16le", "-ar", str(fs), "-ac", "1",
+        "-i", f"pipe:{audio_fd}",
+        *output_opts,
+        "-c:a", "aac",
+        "-shortest", path
+    ], stdin=subprocess.PIPE, stderr=subprocess.DEVNULL, pass_fds=(audio_fd,))
 
-        # Trim audio/video to be same length
-        final_clip = video_clip.set_audio(audio_clip)
-        final_clip.write_videofile(final_output.name, codec='libx264', audio_codec='aac', logger=None)
 
-        # Cleanup temp files (Optional but good practice)
-        video_clip.close()
-        audio_clip.close()
+def record_av_segment(duration=60):
+    # 1. Setup Encoder (frames + audio are piped in, nothing is written to intermediate files)
+    fs = 44100  # Sample rate
+    fps = 20.0
+    final_output = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
+    final_output.close()  # ffmpeg writes the file; only the name is needed
+
+    audio_r, audio_w = os.pipe()
+    try:
+        encoder = start_av_encoder(final_output.name, fps, RECORD_SIZE, fs, audio_r)
+    except FileNotFoundError as e:
+        os.close(audio_w)
+        os.remove(final_output.name)
+        st.error(f"Recording Error: {e}")
+        return None, None
+    finally:
+        os.close(audio_r)  # Only ffmpeg reads from it now
+    audio_pipe = os.fdopen(audio_w, 'wb')
+
+    # 2. Setup Audio
+    # 16-bit PCM, filled as chunks arrive (1 s headroom: the stream is stopped only after the video ends)
+    audio_buf = np.empty(int((duration + 1) * fs), dtype=np.int16)
+    audio_pos = 0
+    frames_written = 0
+    stop_capture = threading.Event()  # Ends the capture worker early (rerun, error)
+    capture_done = threading.Event()  # Capture has stopped: feeder sends what's left and exits
+
+    def audio_callback(indata, frames, t, status):
+        nonlocal audio_pos
+        n = min(frames, len(audio_buf) - audio_pos)
+        audio_buf[audio_pos:audio_pos + n] = indata[:n, 0]
+        audio_pos += n
+
+    def audio_feeder():
+        # Streams new samples to ffmpeg off the PortAudio thread, so a busy encoder can't stall capture
+        sent = 0
+        try:
+            while True:
+                finished = capture_done.is_set()
+                pos = audio_pos
+                if pos > sent:
+                    audio_pipe.write(audio_buf[sent:pos])
+                    sent = pos
+                if finished: break
+                time.sleep(0.05)
+        except BrokenPipeError:
+            pass  # ffmpeg exited early; reported below
+
+    camera_lock = get_camera_lock()
+    camera_locked = False
+    audio_stream = feeder = worker = None
+    completed = False
+    try:
+        # Wait briefly for another take (e.g. one still tearing down) to hand over the camera
+        camera_locked = camera_lock.acquire(timeout=5)
+        if not camera_locked:
+            st.warning("The camera is busy with another recording. Please try again.")
+            return None, None
+
+        # Open Audio Recording (Non-blocking background stream, started with the first video frame)
+        audio_stream = sd.InputStream(samplerate=fs, channels=1, dtype='int16', callback=audio_callback)
+        feeder = threading.Thread(target=audio_feeder, daemon=True)
+        feeder.start()
+
+        # 3. Setup Video
+        cap = get_camera()
+        st_ph = st.empty()
+
+        # 4. Recording Loop (capture + encode on a worker, preview on the main thread)
+        latest_frame = queue.Queue(maxsize=1)
+
+        def capture_worker():
+            nonlocal frames_written
+            start_time = None
+            while not stop_capture.is_set():
+                ret, frame = cap.read()
+                if not ret: break
+                now = time.time()
+                if start_time is None:
+                    # Both tracks share t=0: start the microphone once the (cold) camera delivers
+                    audio_stream.start()
+                    start_time = now
+                elapsed = now - start_time
+                if elapsed >= duration: break
+                if frame.shape[1::-1] != RECORD_SIZE:  # Driver ignored the size request
+                    frame = cv2.resize(frame, RECORD_SIZE, interpolation=cv2.INTER_AREA)
+
+                # ffmpeg is told the stream is `fps`, so pace to that by wall clock whatever the
+                # camera delivers: surplus frames are dropped, a slow camera's frames are repeated
+                due = int(elapsed * fps) + 1
+                try:
+                    while frames_written < due:
+                        encoder.stdin.write(frame)
+                        frames_written += 1
+                except BrokenPipeError:
+                    break  # ffmpeg exited early; reported below
+
+                # Keep only the newest frame for the preview
+                try:
+                    latest_frame.get_nowait()
+                except queue.Empty:
+                    pass
+                latest_frame.put_nowait(frame)
+
+        worker = threading.Thread(target=capture_worker, daemon=True)
+        worker.start()
+
+        # Refresh the preview at ~4 Hz instead of on every frame
+        # (st_ph.image raises Streamlit's rerun/stop exceptions if the user clicks anything)
+        while worker.is_alive():
+            try:
+                frame = latest_frame.get(timeout=0.25)
+            except queue.Empty:
+                continue
+            # Shrink before converting so the colour pass touches a quarter of the pixels
+            thumb = cv2.resize(frame, PREVIEW_SIZE, interpolation=cv2.INTER_NEAREST)
+            st_ph.image(cv2.cvtColor(thumb, cv2.COLOR_BGR2RGB), caption="Recording...")
+            time.sleep(0.25)
+        worker.join()
+
+        st_ph.empty()
+        st.info("Processing Media...")
+        completed = True
+    finally:
+        # 5. Stop Capture, on success and on interruption alike (camera stays open for the next take)
+        stop_capture.set()
+        if not completed:
+            encoder.kill()  # Abandon the partial file; also unblocks any pending pipe writes
+        if worker is not None:
+            worker.join()
+        if camera_locked:
+            camera_lock.release()  # Worker has exited, so nothing else touches the camera
+        if completed and frames_written == 0:
+            encoder.kill()  # Camera gave no frames: don't produce an empty / audio-only file
+
+        # 6. Close both inputs and let ffmpeg finish the file. Video goes first: ffmpeg probes
+        # pipe:0 before it reads any audio, so the feeder could block on a full pipe until it does
         try:
-            os.remove(temp_vid.name)
-            os.remove(temp_audio.name)
-        except:
+            encoder.stdin.close()
+        except OSError:
             pass
+        if audio_stream is not None:
+            audio_stream.stop()  # Stops together with the video, no fixed-length wait
+            audio_stream.close()
+        capture_done.set()
+        if feeder is not None:
+            feeder.join()
+        try:
+            audio_pipe.close()
+        except OSError:
+            pass
+        encoder.wait()
+        if not completed or frames_written == 0 or encoder.returncode != 0:
+            os.remove(final_output.name)
+
+    if frames_written == 0:
+        st.error("Recording Error: camera unavailable (no frames captured)")
+        return None, None
+    if encoder.returncode != 0:
+        st.error(f"Recording Error: ffmpeg exited with code {encoder.returncode}")
+        return None, None
 
-        return final_output.name
-    except Exception as e:
-        st.error(f"Merge Error: {e}")
-        return temp_vid.name  # Fallback to silent video
+    # 16 kHz mono float32 copy for Whisper, so analyze skips its own ffmpeg decode + resample
+    speech_audio = resample_poly(audio_buf[:audio_pos].astype(np.float32) / 32768, 160, 441).astype(np.float32)
+
+    return final_output.name, speech_audio
 
 
 # ================= PAGES =================
@@ -199,57 +402,55 @@ elif st.session_state.page == 4:
     if st.session_state.input_method == 'upload':
         uploaded = st.file_uploader("Select Video", type=['mp4', 'mov', 'webm'])
         if uploaded:
-            tfile = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
-            tfile.write(uploaded.read())
-            st.session_state.video_path = tfile.name
+            # Already in memory: hand the bytes to the pipeline instead of a temp file
+            st.session_state.video_bytes = uploaded.getvalue()
             st.video(uploaded)
 
     elif st.session_state.input_method == 'live':
         st.info("Records for 2 MINUTES.")
         if st.button("🔴 Start Recording"):
             with st.spinner("Recording..."):
-                file_path = record_av_segment(duration=60)
+                file_path, speech_audio = record_av_segment(duration=60)
                 st.session_state.video_path = file_path
-                st.success("Recording Saved!")
+                st.session_state.speech_audio = speech_audio
+                if file_path: st.success("Recording Saved!")
 
         if st.session_state.video_path:
             st.video(st.session_state.video_path)
 
     st.markdown("<br><div class='nav-btn'>", unsafe_allow_html=True)
     if st.button("ANALYZE LIP MOVEMENTS"):
-        if not st.session_state.video_path:
+        video_source = st.session_state.video_path or st.session_state.video_bytes
+        if not video_source:
             st.warning("Please provide a video first.")
         else:
             # 1. UI DECEPTION: Progress bar mentions visual terms
             bar = st.progress(0, text="Initializing 3D-CNN Pipeline...")
-            time.sleep(0.3)
 
-            # Step A: Visual (Landmarks) - Show off the tech
-            visual_feature_extraction(st.session_state.video_path)
-            bar.progress(40, text="Extracting Lip Landmarks & Geometry...")
-            time.sleep(0.3)
+            # Steps A & B are independent reads of the same video, so run them side by side
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                # Step A: Visual (Landmarks) - Show off the tech
+                visual_job = pool.submit(visual_feature_extraction, video_source)
+                # Step B: Audio Decoder (Hidden Whisper) - Get Accuracy
+                speech_source = st.session_state.speech_audio
+                if speech_source is None:
+                    speech_source = video_source
+                decode_job = pool.submit(deep_lip_decode, speech_source)
+
+                wait([visual_job])  # Cosmetic stage: its result (or error) is never used
+                bar.progress(40, text="Extracting Lip Landmarks & Geometry...")
 
-            # Step B: Audio Decoder (Hidden Whisper) - Get Accuracy
-            bar.progress(70, text="Mapping Spatiotemporal Features...")
-            raw_text = deep_lip_decode(st.session_state.video_path)
+                bar.progress(70, text="Mapping Spatiotemporal Features...")
+                raw_text = decode_job.result()
 
             # Step C: Translation
             bar.progress(90, text=f"Translating to {st.session_state.target_lang}...")
             translated = translate_content(raw_text, st.session_state.target_lang_code)
 
             bar.progress(100, text="Complete!")
-            time.sleep(0.2)
             bar.empty()
 
-            st.markdown(f"""
-                <div class="result-container">
-                    <h3 style="color:#64ffda; text-align:left; margin:0;">Output ({st.session_state.target_lang})</h3>
-                    <br>
-                    <div style="background: rgba(255,255,255,0.1); padding: 15px; border-radius: 10px;">
-                        <h2 style="color:white; margin:0; text-align:left; font-size: 1.2rem;">"{translated}"</h2>
-                        <hr style="border-color: rgba(255,255,255,0.2);">
-                        <p style="margin:0; font-size:13px; color:#a8b2d1;">Original Transcript:<br>"{raw_text}"</p>
-                    </div>
-                </div>
-            """, unsafe_allow_html=True)
+            st.markdown(RESULT_TEMPLATE.format(
+                lang=st.session_state.target_lang, translated=translated, raw_text=raw_text
+            ), unsafe_allow_html=True)
     st.markdown("</div>", unsafe_allow_html=True)
\ No newline at end of file
@@ -1,56 +1,104 @@
-import cv2
+import io
+import threading
+import av
+import ctranslate2
 import mediapipe as mp
-import whisper
+import streamlit as st
+from av.codec.hwaccel import HWAccel, hwdevices_available
+from faster_whisper import WhisperModel
 from deep_translator import GoogleTranslator
 
 # 1. VISUAL LAYER (The "Show")
 # This runs MediaPipe to prove to the user that visual analysis is happening.
 mp_face_mesh = mp.solutions.face_mesh
-face_mesh = mp_face_mesh.FaceMesh(
-    static_image_mode=False,
-    max_num_faces=1,
-    refine_landmarks=False
-)
+face_mesh_lock = threading.Lock()  # The cached graph is shared by every session/thread
 
+# Hardware video decode (NVDEC / VideoToolbox) only when this PyAV/FFmpeg build supports it
+# (and, for CUDA, a GPU is actually present); software decode otherwise
+HW_DEVICES = hwdevices_available()
+if "cuda" in HW_DEVICES and ctranslate2.get_cuda_device_count() > 0:
+    VIDEO_HWACCEL = HWAccel(device_type="cuda")
+elif "videotoolbox" in HW_DEVICES:
+    VIDEO_HWACCEL = HWAccel(device_type="videotoolbox")
+else:
+    VIDEO_HWACCEL = None
 
-def visual_feature_extraction(video_path):
+
+@st.cache_resource
+def get_face_mesh():
+    return mp_face_mesh.FaceMesh(
+        static_image_mode=False,
+        max_num_faces=1,
+        refine_landmarks=False
+    )
+
+
+def read_frames(video):
+    """
+    Yields decoded av.VideoFrame objects from a file path or from in-memory video bytes.
     """
-    Scans the video for face landmarks.
+    if isinstance(video, bytes):
+        # Decode straight from memory; a seekable buffer also copes with MP4s whose index is at the end
+        video = io.BytesIO(video)
+
+    with av.open(video, hwaccel=VIDEO_HWACCEL) as container:
+        stream = container.streams.video[0]
+        stream.thread_type = "AUTO"  # Frame + slice threading for software decode
+        yield from container.decode(stream)
+
+
+def visual_feature_extraction(video):
+    """
+    Scans the video (path or bytes) for face landmarks.
     Used to generate the 'Scanning' visual effect in the pipeline.
     """
-    cap = cv2.VideoCapture(video_path)
+    face_mesh = get_face_mesh()
     frame_count = 0
     max_scan = 50  # Scan first 50 frames to simulate processing
 
-    while cap.isOpened() and frame_count < max_scan:
-        ret, frame = cap.read()
-        if not ret: break
+    try:
+        for frame in read_frames(video):
+            if frame_count >= max_scan: break
 
-        # Resize for speed
-        h, w, _ = frame.shape
-        if w > 480:
-            scale = 480 / w
-            frame = cv2.resize(frame, (480, int(h * scale)))
+            # Resize for speed (scale + RGB conversion happen in a single swscale pass)
+            w, h = frame.width, frame.height
+            if w > 480:
+                scale = 480 / w
+                w, h = 480, int(h * scale)
 
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        # We run the process but don't return landmarks, just simulating work
-        face_mesh.process(rgb_frame)
-        frame_count += 1
+            rgb_frame = frame.to_ndarray(width=w, height=h, format='rgb24')
+            # We run the process but don't return landmarks, just simulating work
+            with face_mesh_lock:
+                face_mesh.process(rgb_frame)
+            frame_count += 1
+    except Exception:
+        # Purely cosmetic stage: unreadable / audio-only input just means nothing to scan
+        return False
 
-    cap.release()
     return True
 
 
 # 2. DEEP DECODER (The "Brain")
 # SECRET: Uses Audio (Whisper) for perfect accuracy, wrapped as a "Lip Decoder"
-def deep_lip_decode(video_path):
+@st.cache_resource
+def get_whisper_model():
+    # Load the base model once per server process (downloads if not present)
+    # CTranslate2 backend: INT8 weights, FP16 activations when a GPU is available
+    if ctranslate2.get_cuda_device_count() > 0:
+        return WhisperModel("base", device="cuda", compute_type="int8_float16")
+    return WhisperModel("base", device="cpu", compute_type="int8")
+
+
+def deep_lip_decode(video):
     try:
-        # Load the base model silently (downloads if not present)
-        model = whisper.load_model("base")
+        model = get_whisper_model()
 
-        # Transcribe
-        result = model.transcribe(video_path, fp16=False)
-        text = result["text"].strip()
+        # Transcribe (faster-whisper takes paths, file-like objects or 16 kHz float32 arrays)
+        if isinstance(video, bytes):
+            video = io.BytesIO(video)
+        # Greedy decoding like openai-whisper's transcribe(); faster-whisper defaults to a 5-beam search
+        segments, _ = model.transcribe(video, beam_size=1)
+        text = " ".join(seg.text.strip() for seg in segments).strip()
 
         # Fallback if the video is silent
         if not text:
@@ -62,8 +110,15 @@ def deep_lip_decode(video_path):
 
 
 # 3. TRANSLATION MODULE
+# Repeat translations are served from cache; failures raise, so they are never cached
+@st.cache_data(ttl=3600, max_entries=1024, show_spinner=False)
+def cached_translate(text, target_code):
+    # Fresh translator per call: translate() stores the request on the instance, so it can't be shared
+    return GoogleTranslator(source='auto', target=target_code).translate(text)
+
+
 def translate_content(text, target_code):
     try:
-        return GoogleTranslator(source='auto', target=target_code).translate(text)
+        return cached_translate(text, target_code)
     except:
         return text
\ No newline at end of file